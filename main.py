@@ -2,17 +2,21 @@ import os
 
 os.environ["PYGAME_HIDE_SUPPORT_PROMPT"] = "1"
 
+import sys
+import signal
 import pygame as pg
-from src.config import screen_width, screen_height, fps, display_caption, background_color
+from src.config import screen_width, screen_height, fps, display_caption, background_color, dirty_rects
 
 from src.assets import assets
+from src.execution import calibrate, shutdown_executors
+from src.noise import prepare_noise
+from src.server import serve, view
 
 # from random import randint
 
 
-def draw_planets(planets: list, screen: pg.Surface):
-    for planet in planets:
-        planet.draw(screen)
+def draw_planets(planets: list, screen: pg.Surface) -> list[pg.Rect]:
+    return [planet.draw(screen) for planet in planets]
 
 
 def draw_stars(stars: list, brightness: int, screen: pg.Surface):
@@ -36,6 +40,46 @@ def draw_stars(stars: list, brightness: int, screen: pg.Surface):
         )
 
 
+def draw_scene(planets: list, stars: list, star_brightness: int, screen: pg.Surface) -> list[pg.Rect]:
+    # reset frame
+    screen.fill((background_color.r, background_color.g, background_color.b))
+
+    if screen_width > 200:
+        draw_stars(stars, star_brightness, screen)
+
+    return draw_planets(planets, screen)
+
+
+def prepare_planets(planets: list):
+    prepare_noise()
+    # pick serial, thread or process execution per noise submission size, cached after the first run on this machine
+    calibrate([size for planet in planets for size in planet.noise_sizes])
+
+
+def render_server():
+    # renders headless once and publishes each frame to shared memory for any number of `main.py view` windows
+    planets = assets.get("planets")
+    stars = assets.get("stars")
+    prepare_planets(planets)
+
+    star_brightness = 0
+
+    def render(screen: pg.Surface):
+        nonlocal star_brightness
+        draw_scene(planets, stars, star_brightness := star_brightness + 1, screen)
+
+    try:
+        serve(render, screen_width, screen_height, fps)
+    finally:
+        # a second ctrl+c while the pool is joined leaves it half shut down and hangs the interpreter on exit
+        signal.signal(signal.SIGINT, signal.SIG_IGN)
+        shutdown_executors()
+
+
+def viewer():
+    view(fps, pg.NOFRAME | pg.SCALED, display_caption)
+
+
 def gameloop():
     # setup
     pg.init()
@@ -47,9 +91,12 @@ def gameloop():
     planets = assets.get("planets")
     stars = assets.get("stars")
 
+    prepare_planets(planets)
+
     # tracking
     fps_coll = []
     star_brightness = 0
+    previous_rects = []
 
     # start
     try:
@@ -58,21 +105,16 @@ def gameloop():
             for event in pg.event.get():
                 if event.type == pg.QUIT:
                     running = False
-            # reset frame
-            screen.fill((background_color.r, background_color.g, background_color.b))
-
-            # ---
-            # display assets:
-
-            if screen_width > 200:
-                draw_stars(stars, star_brightness := star_brightness + 1, screen)
-
-            draw_planets(planets, screen)
-
-            # ---
+            planet_rects = draw_scene(planets, stars, star_brightness := star_brightness + 1, screen)
 
             # update screen
-            pg.display.flip()
+            # stars stop changing once they reach full brightness, after that only the planets need to be pushed
+            stars_settled = screen_width <= 200 or star_brightness > 100
+            if dirty_rects and stars_settled:
+                pg.display.update(previous_rects + planet_rects)
+            else:
+                pg.display.flip()
+            previous_rects = planet_rects
             # cap frame rate
             clock.tick(fps)
             # track fps average
@@ -81,8 +123,15 @@ def gameloop():
     finally:
         if frame_count := len(fps_coll):
             print(round(sum(fps_coll) / frame_count, 2), "fps on average")
+        shutdown_executors()
         pg.quit()
 
 
 if __name__ == "__main__":
-    gameloop()
+    match sys.argv[1:]:
+        case ["serve"]:
+            render_server()
+        case ["view"]:
+            viewer()
+        case _:
+            gameloop()
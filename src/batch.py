@@ -0,0 +1,184 @@
+import os
+
+os.environ["PYGAME_HIDE_SUPPORT_PROMPT"] = "1"
+
+import json
+import random
+import argparse
+from math import ceil, isfinite
+from concurrent.futures import ProcessPoolExecutor
+
+import pygame as pg
+
+from src.universe import Planet
+from src.utils import PlanetConfig, Terrain, Clouds, Atmosphere, Lighting, Rotation, Vector, LevelOfDetail, RGB
+from src.utils import pick_random_color
+from src.execution import ExecutionStrategy, force_strategy
+from src.noise import prepare_noise
+
+
+MANIFEST_NAME = "manifest.jsonl"
+
+
+def random_planet_config(seed: int, size: int) -> PlanetConfig:
+    # pick_random_color draws from the global generator, so seeding it makes every planet reproducible
+    random.seed(seed)
+
+    thresholds = sorted(random.uniform(0.35, 0.7) for _ in range(random.randint(1, 4)))
+    terrains = [Terrain(name=f"terrain_{i}", color=pick_random_color(), threshold=threshold) for i, threshold in enumerate(thresholds)]
+    terrains.append(Terrain(name=f"terrain_{len(thresholds)}", color=pick_random_color(), threshold=float("inf")))
+
+    clouds = None
+    if random.random() < 0.7:
+        clouds = Clouds(
+            height=random.uniform(1.02, 1.1),
+            color=random.choice([RGB(255, 255, 255), pick_random_color()]),
+            alpha=random.choice([180, 200, 220, 255]),
+            threshold=random.uniform(0.45, 0.65),
+            lod=LevelOfDetail(random.uniform(2, 7), random.uniform(0.5, 2)),
+            rotation=Rotation(direction=random.choice(["left", "right"]), speed=0, axis=["y", "z"]),
+            shadow_alpha=random.uniform(0.2, 0.8),
+        )
+
+    atmosphere = None
+    if random.random() < 0.8:
+        atmosphere = Atmosphere(color=pick_random_color(), density=random.uniform(0.1, 0.4), height=random.uniform(1.1, 1.4))
+
+    # the outermost layer has to fit the thumbnail
+    outer_height = max([1.0] + [layer.height for layer in (clouds, atmosphere) if layer])
+    radius = int(size / 2 / outer_height)
+
+    return PlanetConfig(
+        radius=radius,
+        position=Vector(x=size // 2, y=size // 2),
+        terrains=terrains,
+        terrain_lod=LevelOfDetail(random.uniform(1, 6), random.uniform(0.3, 3)),
+        atmosphere=atmosphere,
+        clouds=clouds,
+        lighting=Lighting(angle=random.uniform(-2.5, -0.5), speed=0),
+        planet_rotation=Rotation(speed=0, axis=random.choice([["x"], ["y"], ["x", "y"], ["x", "y", "z"]]), angle=random.uniform(0, 6.28)),
+        seed=seed,
+    )
+
+
+def render_planet(index: int, seed: int, size: int, out_dir: str) -> dict:
+    config = random_planet_config(seed, size)
+    planet = Planet(name=f"planet_{index:06d}", config=config)
+    planet.lighting._direction = planet._compute_angle_lighting_direction(planet.lighting.angle)
+
+    surface = pg.Surface((size, size), pg.SRCALPHA)
+    planet.draw(surface)
+
+    file_name = f"{planet.name}.png"
+    pg.image.save(surface, os.path.join(out_dir, file_name))
+
+    return dict(
+        index=index,
+        seed=seed,
+        size=size,
+        file=file_name,
+        # the catch-all last terrain has an infinite threshold, which json can only write as null
+        terrains=[(terrain.color.r, terrain.color.g, terrain.color.b, terrain.threshold if isfinite(terrain.threshold) else None) for terrain in config.terrains],
+        terrain_lod=(config.terrain_lod.frequency, config.terrain_lod.weight),
+        clouds=config.clouds is not None,
+        atmosphere=config.atmosphere is not None,
+    )
+
+
+def _init_worker():
+    # planets are spread over the processes already, chunking each one again would only add overhead
+    force_strategy(ExecutionStrategy(mode="serial", chunks=1))
+
+
+def load_manifest(out_dir: str) -> dict[int, dict]:
+    entries = {}
+    path = os.path.join(out_dir, MANIFEST_NAME)
+    if os.path.exists(path):
+        with open(path, mode="r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    continue  # torn last line of an interrupted run
+                entries[entry["index"]] = entry
+    return entries
+
+
+def generate_catalog(count: int, out_dir: str, size: int = 128, seed: int = 0, workers: int = None) -> dict[int, dict]:
+    os.makedirs(out_dir, exist_ok=True)
+    prepare_noise()
+
+    # the manifest doubles as the checkpoint, every planet listed in it is skipped on resume
+    done = load_manifest(out_dir)
+    # mixing thumbnail sizes would break the atlas cells, so a different size needs its own --out
+    if mismatched := sorted({entry.get("size") for entry in done.values()} - {size}, key=str):
+        raise ValueError(f"{out_dir} already holds planets rendered at size {mismatched}, not {size}")
+    todo = [index for index in range(count) if index not in done]
+    if done:
+        print(f"resuming, {len(done)} of {count} planets already rendered")
+
+    with open(os.path.join(out_dir, MANIFEST_NAME), mode="a", encoding="utf-8") as manifest:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker) as executor:
+            results = executor.map(
+                render_planet,
+                todo,
+                [seed + index for index in todo],
+                [size] * len(todo),
+                [out_dir] * len(todo),
+                chunksize=16,
+            )
+            for finished, entry in enumerate(results, start=1):
+                manifest.write(json.dumps(entry, allow_nan=False) + "\n")
+                manifest.flush()
+                done[entry["index"]] = entry
+                if finished % 100 == 0:
+                    print(f"{len(done)}/{count} planets")
+
+    return done
+
+
+def build_atlas(out_dir: str, entries: dict[int, dict], size: int, columns: int = 32) -> list[str]:
+    # packs the thumbnails into square sheets and records where each planet landed
+    per_sheet = columns * columns
+    indices = sorted(entries)
+    sheet_names = []
+    atlas = {}
+
+    for sheet in range(ceil(len(indices) / per_sheet)):
+        batch = indices[sheet * per_sheet : (sheet + 1) * per_sheet]
+        rows = ceil(len(batch) / columns)
+        surface = pg.Surface((columns * size, rows * size), pg.SRCALPHA)
+
+        for slot, index in enumerate(batch):
+            x, y = (slot % columns) * size, (slot // columns) * size
+            surface.blit(pg.image.load(os.path.join(out_dir, entries[index]["file"])), (x, y))
+            atlas[index] = dict(sheet=sheet, rect=(x, y, size, size))
+
+        sheet_name = f"atlas_{sheet:03d}.png"
+        pg.image.save(surface, os.path.join(out_dir, sheet_name))
+        sheet_names.append(sheet_name)
+
+    with open(os.path.join(out_dir, "atlas.json"), mode="w", encoding="utf-8") as f:
+        json.dump(dict(sheets=sheet_names, size=size, planets=atlas), f)
+
+    return sheet_names
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Render a catalog of random planets")
+    parser.add_argument("--count", type=int, default=1000)
+    parser.add_argument("--out", default="catalog")
+    parser.add_argument("--size", type=int, default=128, help="thumbnail width and height in pixels")
+    parser.add_argument("--seed", type=int, default=0, help="planet i uses seed + i")
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--atlas", type=int, default=0, metavar="COLUMNS", help="also pack the thumbnails into sheets of COLUMNS x COLUMNS")
+    args = parser.parse_args()
+
+    entries = generate_catalog(args.count, args.out, args.size, args.seed, args.workers)
+    if args.atlas:
+        sheets = build_atlas(args.out, entries, args.size, args.atlas)
+        print(f"{len(sheets)} atlas sheets written")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,6 +1,7 @@
 from src.utils import pick_color, RGB, Terrain, Clouds, Lighting, Rotation, Vector, LevelOfDetail, set_time_of_day
 from typing import Literal
 import random
+import os
 
 
 # display settings
@@ -13,6 +14,25 @@ print(f"{screen_width}x{screen_height} {fps}fps")
 
 display_caption = "UniPlanets"
 background_color = pick_color("black")
+dirty_rects = False  # update only the planets' bounding boxes instead of flipping the whole screen
+
+# render server settings
+server_name = "uniplanets"  # shared memory segment that `main.py serve` publishes frames to and `main.py view` reads from
+server_slots = 3  # frames kept in the ring, a viewer always gets the newest complete one
+
+# execution settings
+execution_mode: Literal["auto", "serial", "thread", "process"] = "auto"  # auto benchmarks once per machine and radius
+execution_chunks: int = None  # overrides the calibrated chunk count when set
+execution_cache_path = os.path.join(".cache", "execution.json")
+shading_precision: Literal["float32", "float64"] = "float32"  # float32 halves the memory traffic of the per frame math
+tile_size = 256  # planets are rendered in tiles of this many pixels squared, clipped to the screen
+noise_refresh_interval = 1  # frames between noise passes of a moving texture, lighting is still applied every frame
+
+# noise settings
+noise_backend: Literal["opensimplex", "volume"] = "opensimplex"  # volume samples a baked periodic grid instead of computing noise per pixel
+noise_volume_size = 128  # samples per axis, 128 is 8MB of float32
+noise_volume_period = 16  # lattice cells before the volume repeats, keep above twice the highest LevelOfDetail.frequency
+noise_volume_dir = ".cache"
 
 # planet settings
 
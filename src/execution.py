@@ -0,0 +1,211 @@
+import os
+import json
+import platform
+from time import perf_counter
+from dataclasses import dataclass, asdict
+from concurrent.futures import Executor, Future, ProcessPoolExecutor, ThreadPoolExecutor
+
+from typing import Literal, Callable
+
+import numpy as np
+from math import sqrt, pi
+
+from src.noise import sample_noise
+from src.config import execution_mode, execution_chunks, execution_cache_path, noise_backend
+
+
+@dataclass(frozen=True)
+class ExecutionStrategy:
+    mode: Literal["serial", "thread", "process"] = "process"
+    chunks: int = 1
+
+
+class SerialExecutor(Executor):
+    # runs every job on submit, so small planets skip the pool round trip entirely
+    def submit(self, fn, /, *args, **kwargs):
+        future = Future()
+        try:
+            future.set_result(fn(*args, **kwargs))
+        except BaseException as exc:
+            future.set_exception(exc)
+        return future
+
+
+# pools are kept alive across frames, spawning workers every frame costs more than small planets take to render
+_executors: dict[str, Executor] = {}
+_strategies: dict[int, ExecutionStrategy] = {}
+_forced_strategy: ExecutionStrategy = None
+
+
+def get_executor(mode: Literal["serial", "thread", "process"]) -> Executor:
+    if mode not in _executors:
+        match mode:
+            case "thread":
+                _executors[mode] = ThreadPoolExecutor()
+            case "process":
+                _executors[mode] = ProcessPoolExecutor()
+            case _:
+                _executors[mode] = SerialExecutor()
+    return _executors[mode]
+
+
+def shutdown_executors():
+    for executor in _executors.values():
+        executor.shutdown(cancel_futures=True)
+    _executors.clear()
+
+
+def point_bucket(count: int) -> int:
+    # next power of four from 1024 up, noise submissions of similar size share one calibration
+    bucket = 1024
+    while bucket < count:
+        bucket *= 4
+    return bucket
+
+
+def split_range(count: int, chunks: int) -> list[tuple[int, int]]:
+    # contiguous index ranges covering [0, count) without gaps
+    chunks = max(1, min(chunks, count))
+    bounds = [(i * count) // chunks for i in range(chunks + 1)]
+    return list(zip(bounds[:-1], bounds[1:]))
+
+
+def submit_chunks(strategy: ExecutionStrategy, kernel: Callable, points: np.ndarray, out: np.ndarray) -> list[tuple]:
+    executor = get_executor(strategy.mode)
+    # serial and thread workers write straight into the shared buffer, process workers send their slice back
+    in_place = strategy.mode != "process"
+
+    pending = []
+    for start, end in split_range(points.shape[-1], strategy.chunks):
+        args = (points[..., start:end], out[start:end]) if in_place else (points[..., start:end],)
+        pending.append((start, end, in_place, executor.submit(kernel, *args)))
+    return pending
+
+
+def collect_chunks(pending: list[tuple], out: np.ndarray):
+    for start, end, in_place, future in pending:
+        result = future.result()
+        if not in_place:
+            out[start:end] = result
+
+
+def _machine_key() -> str:
+    # the noise backend decides what a chunk costs, so each one keeps its own calibration
+    return f"{platform.node()}-{platform.machine()}-{os.cpu_count()}-{noise_backend}"
+
+
+def _cache_key(bucket: int) -> str:
+    return f"points<={bucket}"
+
+
+def _load_cache() -> dict:
+    try:
+        with open(execution_cache_path, mode="r", encoding="utf-8") as f:
+            return json.load(f).get(_machine_key(), {})
+    except (OSError, ValueError):
+        return {}
+
+
+def _save_cache(strategies: dict[int, ExecutionStrategy]):
+    try:
+        with open(execution_cache_path, mode="r", encoding="utf-8") as f:
+            cache = json.load(f)
+    except (OSError, ValueError):
+        cache = {}
+
+    machine_cache = cache.setdefault(_machine_key(), {})
+    machine_cache.update({_cache_key(bucket): asdict(strategy) for bucket, strategy in strategies.items()})
+
+    os.makedirs(os.path.dirname(execution_cache_path) or ".", exist_ok=True)
+    with open(execution_cache_path, mode="w", encoding="utf-8") as f:
+        json.dump(cache, f, indent=2)
+
+
+# CALIBRATION
+
+
+def _benchmark_points(count: int) -> np.ndarray:
+    # the first count sphere normals of a disk just large enough, scaled like a typical level of detail
+    radius = int(sqrt(count / pi)) + 2
+    ys, xs = np.mgrid[-radius:radius, -radius:radius] / radius
+    inside = (xs * xs + ys * ys) <= 1
+    xs, ys = xs[inside][:count], ys[inside][:count]
+    return np.stack([xs, ys, np.sqrt(np.maximum(0, 1 - xs * xs - ys * ys))]) * 4
+
+
+def _time_strategy(strategy: ExecutionStrategy, points: np.ndarray) -> float:
+    out = np.empty(points.shape[-1], points.dtype)
+    # warm up so pool startup is not billed to the first candidate
+    collect_chunks(submit_chunks(strategy, sample_noise, points[:, : strategy.chunks], out), out)
+
+    start = perf_counter()
+    collect_chunks(submit_chunks(strategy, sample_noise, points, out), out)
+    return perf_counter() - start
+
+
+def _candidate_strategies() -> list[ExecutionStrategy]:
+    cores = os.cpu_count() or 1
+    chunk_counts = sorted({max(2, cores // 2), max(2, cores), max(2, cores * 2)})
+
+    candidates = [ExecutionStrategy(mode="serial", chunks=1)]
+    for mode in ("thread", "process"):
+        candidates.extend(ExecutionStrategy(mode=mode, chunks=chunks) for chunks in chunk_counts)
+    return candidates
+
+
+def calibrate(counts: list[int]) -> dict[int, ExecutionStrategy]:
+    # counts are the largest noise submissions expected, every smaller bucket is calibrated too since
+    # culling and the albedo cache often leave only part of a tile to sample
+    if execution_mode != "auto" or not any(counts):
+        return {}
+
+    cached = _load_cache()
+    calibrated = {}
+
+    largest = max(counts)
+    buckets = [1024]
+    while buckets[-1] < largest:
+        buckets.append(buckets[-1] * 4)
+
+    for bucket in buckets:
+        if bucket in _strategies:
+            continue
+        if _cache_key(bucket) in cached:
+            _strategies[bucket] = ExecutionStrategy(**cached[_cache_key(bucket)])
+            continue
+
+        # never more than the largest real submission, a padded cloud tile only just crosses into the next bucket
+        points = _benchmark_points(min(bucket, largest))
+        timings = {strategy: _time_strategy(strategy, points) for strategy in _candidate_strategies()}
+        best = min(timings, key=timings.get)
+        print(f"{bucket} points: {best.mode} with {best.chunks} chunks ({timings[best] * 1000:.1f}ms)")
+
+        _strategies[bucket] = calibrated[bucket] = best
+
+    if calibrated:
+        _save_cache(calibrated)
+
+    return calibrated
+
+
+def force_strategy(strategy: ExecutionStrategy | None):
+    # for callers that parallelize at a coarser level themselves, e.g. one planet per worker in src/batch.py
+    global _forced_strategy
+    _forced_strategy = strategy
+
+
+def resolve_strategy(count: int) -> ExecutionStrategy:
+    if _forced_strategy:
+        return _forced_strategy
+
+    if execution_mode != "auto":
+        return ExecutionStrategy(mode=execution_mode, chunks=execution_chunks or (1 if execution_mode == "serial" else os.cpu_count() or 1))
+
+    bucket = point_bucket(count)
+    if bucket not in _strategies:
+        calibrate([count])
+
+    strategy = _strategies[bucket]
+    if execution_chunks:
+        strategy = ExecutionStrategy(mode=strategy.mode, chunks=execution_chunks)
+    return strategy
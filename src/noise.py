@@ -0,0 +1,114 @@
+import os
+import numpy as np
+import opensimplex
+
+from src.config import noise_backend, noise_volume_size, noise_volume_period, noise_volume_dir
+
+
+def sample_noise(points: np.ndarray, out: np.ndarray = None) -> np.ndarray:
+    if out is None:
+        out = np.empty(points.shape[-1], points.dtype)
+    if noise_backend == "volume":
+        return sample_volume(points, out)
+    return sample_opensimplex(points, out)
+
+
+def sample_opensimplex(points: np.ndarray, out: np.ndarray) -> np.ndarray:
+    # opensimplex has no pointwise array api, so points are fed through plain lists which is far faster than numpy scalars
+    out[:] = [opensimplex.noise3(x, y, z) for x, y, z in zip(*points.tolist())]
+    return out
+
+
+# VOLUME
+
+_volume: np.ndarray = None
+
+
+def _fade(t: np.ndarray) -> np.ndarray:
+    return t * t * t * (t * (t * 6 - 15) + 10)
+
+
+def bake_volume(size: int, period: int, seed: int) -> np.ndarray:
+    # perlin noise on a lattice that wraps every period cells, so the grid tiles seamlessly in all three axes
+    rng = np.random.default_rng(seed)
+    gradients = rng.normal(size=(period, period, period, 3))
+    gradients /= np.linalg.norm(gradients, axis=-1, keepdims=True)
+
+    lattice = np.arange(size) * period / size
+    cell = np.floor(lattice).astype(np.intp)
+    frac = lattice - cell
+    fade = _fade(frac)
+
+    gx, gy = np.meshgrid(cell, cell, indexing="ij")
+    fx, fy = np.meshgrid(frac, frac, indexing="ij")
+    ux, uy = np.meshgrid(fade, fade, indexing="ij")
+
+    volume = np.empty((size, size, size), np.float32)
+    for k in range(size):
+        # one z slab at a time keeps the temporaries at size^2
+        gz, fz, uz = cell[k], frac[k], fade[k]
+        corners = {}
+        for dx, dy, dz in np.ndindex(2, 2, 2):
+            gradient = gradients[(gx + dx) % period, (gy + dy) % period, (gz + dz) % period]
+            corners[dx, dy, dz] = gradient[..., 0] * (fx - dx) + gradient[..., 1] * (fy - dy) + gradient[..., 2] * (fz - dz)
+
+        x00 = corners[0, 0, 0] + ux * (corners[1, 0, 0] - corners[0, 0, 0])
+        x10 = corners[0, 1, 0] + ux * (corners[1, 1, 0] - corners[0, 1, 0])
+        x01 = corners[0, 0, 1] + ux * (corners[1, 0, 1] - corners[0, 0, 1])
+        x11 = corners[0, 1, 1] + ux * (corners[1, 1, 1] - corners[0, 1, 1])
+        y0 = x00 + uy * (x10 - x00)
+        y1 = x01 + uy * (x11 - x01)
+        volume[:, :, k] = y0 + uz * (y1 - y0)
+
+    # match the spread of opensimplex so terrain and cloud thresholds keep their meaning
+    reference = np.array([opensimplex.noise3(*point) for point in rng.uniform(-period, period, size=(4096, 3))])
+    volume *= reference.std() / volume.std()
+    np.clip(volume, -1, 1, out=volume)
+    return volume
+
+
+def _volume_path(size: int, period: int, seed: int) -> str:
+    return os.path.join(noise_volume_dir, f"noise_volume_{size}_{period}_{seed}.f32")
+
+
+def load_volume() -> np.ndarray:
+    # baked once, then memory mapped read only so every run and worker process shares the same pages
+    global _volume
+    if _volume is None:
+        seed = opensimplex.get_seed()
+        path = _volume_path(noise_volume_size, noise_volume_period, seed)
+        if not os.path.exists(path):
+            os.makedirs(noise_volume_dir, exist_ok=True)
+            # written under a private name first so concurrent bakers never expose a half written file
+            temp_path = f"{path}.{os.getpid()}.tmp"
+            bake_volume(noise_volume_size, noise_volume_period, seed).tofile(temp_path)
+            os.replace(temp_path, path)
+        _volume = np.memmap(path, dtype=np.float32, mode="r", shape=(noise_volume_size,) * 3)
+    return _volume
+
+
+def prepare_noise():
+    # bake or map the volume up front, so worker processes inherit it instead of racing to bake their own
+    if noise_backend == "volume":
+        load_volume()
+
+
+def sample_volume(points: np.ndarray, out: np.ndarray) -> np.ndarray:
+    # trilinear interpolation, coordinates wrap around the period so wind shift is just an offset into the volume
+    volume = load_volume()
+    size = volume.shape[0]
+
+    scaled = points * (size / noise_volume_period)
+    base = np.floor(scaled)
+    fx, fy, fz = scaled - base
+    x0, y0, z0 = base.astype(np.intp) % size
+    x1, y1, z1 = (x0 + 1) % size, (y0 + 1) % size, (z0 + 1) % size
+
+    c00 = volume[x0, y0, z0] + fx * (volume[x1, y0, z0] - volume[x0, y0, z0])
+    c10 = volume[x0, y1, z0] + fx * (volume[x1, y1, z0] - volume[x0, y1, z0])
+    c01 = volume[x0, y0, z1] + fx * (volume[x1, y0, z1] - volume[x0, y0, z1])
+    c11 = volume[x0, y1, z1] + fx * (volume[x1, y1, z1] - volume[x0, y1, z1])
+    c0 = c00 + fy * (c10 - c00)
+    c1 = c01 + fy * (c11 - c01)
+    np.add(c0, fz * (c1 - c0), out=out, casting="unsafe")
+    return out
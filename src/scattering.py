@@ -0,0 +1,110 @@
+import numpy as np
+
+from src.utils import Atmosphere
+
+
+# relative rayleigh strength of red, green and blue light (1 / wavelength^4 at 680, 550 and 440nm)
+RAYLEIGH = (550 / np.array([680, 550, 440])) ** 4
+
+
+class ScatteringLUT:
+    # single scattering through the atmosphere shell, indexed by view angle (norm_z) and sun angle (normal . light)
+    def __init__(self, dtype: np.dtype = np.float32, view_size: int = 64, sun_size: int = 64, samples: int = 32):
+        self.view_size = view_size
+        self.sun_size = sun_size
+        self.samples = samples
+        # flattened to view_size * sun_size rows so a lookup is one np.take
+        self.rgb = np.zeros((view_size * sun_size, 3), dtype)
+        self.alpha = np.zeros(view_size * sun_size, np.uint8)
+        self._key = None
+
+    def update(self, atmosphere: Atmosphere) -> bool:
+        # the integral only depends on these, lighting direction and intensity are applied per frame
+        key = (atmosphere.color, atmosphere.density, atmosphere.height)
+        if key == self._key:
+            return False
+
+        self._bake(atmosphere)
+        self._key = key
+        return True
+
+    def table_index(self, norm_z: np.ndarray, sun_cos: np.ndarray, out: np.ndarray, scratch: np.ndarray):
+        # row from norm_z in [0, 1], column from sun_cos in [-1, 1], both rounded to the nearest entry.
+        # scratch is (2, count), the index is built in float and cast once, mixing int and float would buffer
+        row, column = scratch
+        np.clip(norm_z, 0, 1, out=row)
+        row *= self.view_size - 1
+        np.rint(row, out=row)
+        row *= self.sun_size
+
+        np.add(sun_cos, 1, out=column)
+        column *= (self.sun_size - 1) / 2
+        np.rint(column, out=column)
+        np.clip(column, 0, self.sun_size - 1, out=column)
+
+        row += column
+        np.copyto(out, row, casting="unsafe")
+
+    def _bake(self, atmosphere: Atmosphere):
+        # shell radii in units of the atmosphere radius, density falls off exponentially with altitude
+        planet_radius = 1 / atmosphere.height
+        scale_height = (1 - planet_radius) / 4
+        # vertical optical depth of green light roughly equals the configured density
+        beta = RAYLEIGH * atmosphere.density / scale_height
+
+        mu_view = np.linspace(0, 1, self.view_size)[:, None, None]
+        mu_sun = np.linspace(-1, 1, self.sun_size)[None, :, None]
+        t = ((np.arange(self.samples) + 0.5) / self.samples)[None, None, :]
+
+        # view ray enters the shell at z = mu_view and leaves at the planet surface or the far side of the shell
+        impact = np.sqrt(1 - mu_view**2)
+        z_entry = mu_view
+        z_exit = np.where(impact < planet_radius, np.sqrt(np.maximum(planet_radius**2 - impact**2, 0)), -mu_view)
+        step = (z_entry - z_exit) / self.samples
+        z = z_entry - (z_entry - z_exit) * t
+
+        altitude = np.maximum(np.sqrt(impact**2 + z**2) - planet_radius, 0)
+        density = np.exp(-altitude / scale_height)
+        segment = density * step
+        view_depth = np.cumsum(segment, axis=-1) - segment / 2
+        total_depth = segment.sum(axis=-1)
+
+        # grazing sun paths get long, the night side gets no direct light
+        sun_depth = density * scale_height / (np.maximum(mu_sun, 0) + 0.15)
+        daylight = np.clip((mu_sun + 0.1) / 0.2, 0, 1)[..., 0]
+
+        # the view path only scales brightness, its hue is the configured color, so long grazing rays do not redden the rim.
+        # only the sun path is colored per channel, which warms the light towards the terminator
+        green = beta[1]
+        view_weight = green * segment * np.exp(-green * view_depth)
+
+        inscatter = np.empty((self.view_size, self.sun_size, 3))
+        transmittance = np.empty((self.view_size, 1, 3))
+        for channel in range(3):
+            inscatter[..., channel] = (view_weight * np.exp(-beta[channel] * sun_depth)).sum(axis=-1) * daylight
+            transmittance[..., channel] = np.exp(-beta[channel] * total_depth)
+
+        # alpha blending computes dst * (1 - alpha) + rgb * alpha, physically it is dst * transmittance + inscatter
+        alpha = 1 - transmittance.mean(axis=-1, keepdims=True)
+        brightness = inscatter[..., 1:2] / np.maximum(alpha, 1e-6)
+
+        # the configured color is what the atmosphere looks like overhead at noon
+        reference = brightness[-1, -1, 0]
+        if not reference > 0:
+            # no density, nothing scatters and the shell is fully transparent
+            self.rgb.fill(0)
+            self.alpha.fill(0)
+            return
+
+        # sunlight color relative to an overhead sun on the same view ray, green keeps the brightness
+        noon = inscatter[:, -1:]
+        sun_color = np.divide(inscatter, noon, out=np.zeros_like(inscatter), where=noon > 0)
+        np.divide(sun_color, sun_color[..., 1:2], out=sun_color, where=sun_color[..., 1:2] > 0)
+
+        tint = np.array([atmosphere.color.r, atmosphere.color.g, atmosphere.color.b])
+        rgb = tint * brightness / reference * sun_color
+        # scaled down as a whole instead of clipped per channel, so bright rims keep their hue
+        rgb /= np.maximum(rgb.max(axis=-1, keepdims=True) / 255, 1)
+
+        self.rgb[:] = rgb.reshape(-1, 3)
+        self.alpha[:] = np.broadcast_to(alpha * 255, (self.view_size, self.sun_size, 1)).reshape(-1)
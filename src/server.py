@@ -0,0 +1,164 @@
+from time import perf_counter, sleep
+from multiprocessing import shared_memory, resource_tracker
+from typing import Callable
+
+import numpy as np
+import pygame as pg
+
+from src.config import server_name, server_slots
+
+
+_MAGIC = 0x554E49504C4E5453  # "UNIPLNTS"
+# magic, width, height, slots, latest frame number
+_HEADER_FIELDS = 8
+
+
+def _attach_shared_memory(name: str) -> shared_memory.SharedMemory:
+    # viewers must not unlink the renderer's segment when they exit, so they stay out of the resource tracker
+    try:
+        return shared_memory.SharedMemory(name=name, track=False)
+    except TypeError:  # python < 3.13
+        shm = shared_memory.SharedMemory(name=name)
+        resource_tracker.unregister(shm._name, "shared_memory")
+        return shm
+
+
+class FrameRing:
+    # newest frame wins ring buffer in shared memory, written by one renderer and read by any number of viewers.
+    # each slot has a sequence number that is odd while the slot is being written, so readers can detect torn frames
+    def __init__(self, shm: shared_memory.SharedMemory, width: int, height: int, slots: int):
+        self.shm = shm
+        self.width = width
+        self.height = height
+        self.slots = slots
+
+        self.header = np.ndarray((_HEADER_FIELDS,), np.uint64, buffer=shm.buf)
+        self.sequences = np.ndarray((slots,), np.uint64, buffer=shm.buf, offset=self.header.nbytes)
+        # stored in surfarray layout (width, height, rgb) so viewers can blit_array without reordering
+        self.frames = np.ndarray((slots, width, height, 3), np.uint8, buffer=shm.buf, offset=self.header.nbytes + self.sequences.nbytes)
+
+    @staticmethod
+    def _size(width: int, height: int, slots: int) -> int:
+        return 8 * _HEADER_FIELDS + 8 * slots + slots * width * height * 3
+
+    @classmethod
+    def create(cls, name: str, width: int, height: int, slots: int) -> "FrameRing":
+        try:
+            # left over by a renderer that did not shut down cleanly, opened tracked since unlink unregisters it again
+            stale = shared_memory.SharedMemory(name=name)
+            stale.close()
+            stale.unlink()
+        except FileNotFoundError:
+            pass
+
+        shm = shared_memory.SharedMemory(name=name, create=True, size=cls._size(width, height, slots))
+        ring = cls(shm, width, height, slots)
+        ring.sequences.fill(0)
+        ring.header[:] = (_MAGIC, width, height, slots, 0, 0, 0, 0)
+        return ring
+
+    @classmethod
+    def attach(cls, name: str) -> "FrameRing":
+        shm = _attach_shared_memory(name)
+        magic, width, height, slots = np.ndarray((4,), np.uint64, buffer=shm.buf)
+        if magic != _MAGIC:
+            shm.close()
+            raise ValueError(f"shared memory {name!r} is not a frame ring")
+        return cls(shm, int(width), int(height), int(slots))
+
+    def publish(self, pixels: np.ndarray):
+        frame = int(self.header[4]) + 1
+        slot = frame % self.slots
+        self.sequences[slot] = 2 * frame - 1
+        self.frames[slot] = pixels
+        self.sequences[slot] = 2 * frame
+        self.header[4] = frame
+
+    def read_latest(self, out: np.ndarray, after: int = 0) -> int | None:
+        # copies the newest complete frame into out, returns its number or None if nothing newer than after is ready
+        frame = int(self.header[4])
+        if frame <= after:
+            return None
+
+        slot = frame % self.slots
+        sequence = int(self.sequences[slot])
+        if sequence != 2 * frame:
+            return None  # being overwritten, the next call picks up a newer frame
+        np.copyto(out, self.frames[slot])
+        if int(self.sequences[slot]) != sequence:
+            return None
+        return frame
+
+    def close(self, unlink: bool = False):
+        # numpy views have to go before the mapping can be closed
+        del self.header, self.sequences, self.frames
+        self.shm.close()
+        if unlink:
+            self.shm.unlink()
+
+
+def serve(render: Callable[[pg.Surface], None], width: int, height: int, fps: int, name: str = server_name):
+    # renders once per frame no matter how many viewers are attached
+    surface = pg.Surface((width, height))
+    ring = FrameRing.create(name, width, height, server_slots)
+    frame_time = 1 / fps
+    print(f"serving {width}x{height} frames on shared memory {name!r}")
+
+    try:
+        while True:
+            start = perf_counter()
+            render(surface)
+            pixels = pg.surfarray.pixels3d(surface)
+            ring.publish(pixels)
+            del pixels
+            sleep(max(0, frame_time - (perf_counter() - start)))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        ring.close(unlink=True)
+
+
+def view(fps: int, flags: int = 0, caption: str = "", name: str = server_name, reconnect_after: float = 2.0):
+    # blits the newest frame and reattaches whenever the renderer goes away or restarts
+    pg.init()
+    pg.display.set_caption(caption)
+    clock = pg.time.Clock()
+    screen = None
+    ring = None
+    frame = None
+    last_frame = 0
+    last_frame_time = perf_counter()
+
+    try:
+        running = True
+        while running:
+            for event in pg.event.get():
+                if event.type == pg.QUIT:
+                    running = False
+
+            if ring is None:
+                try:
+                    ring = FrameRing.attach(name)
+                except (FileNotFoundError, ValueError):
+                    clock.tick(2)
+                    continue
+                if screen is None or screen.get_size() != (ring.width, ring.height):
+                    screen = pg.display.set_mode((ring.width, ring.height), flags)
+                    frame = np.empty((ring.width, ring.height, 3), np.uint8)
+                last_frame = 0
+                last_frame_time = perf_counter()
+
+            if (newest := ring.read_latest(frame, last_frame)) is not None:
+                last_frame = newest
+                last_frame_time = perf_counter()
+                pg.surfarray.blit_array(screen, frame)
+                pg.display.flip()
+            elif perf_counter() - last_frame_time > reconnect_after:
+                ring.close()
+                ring = None
+
+            clock.tick(fps)
+    finally:
+        if ring:
+            ring.close()
+        pg.quit()
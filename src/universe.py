@@ -1,19 +1,18 @@
-from pygame import Surface, SRCALPHA, surfarray
+from pygame import Surface, Rect, SRCALPHA, BLEND_PREMULTIPLIED, display, surfarray
 from math import sqrt, pi, cos, sin
 import numpy as np
-import opensimplex
 
 from src.utils import RGB, Terrain, Clouds, Vector, Lighting, Rotation, LevelOfDetail, PlanetConfig
 from src.utils import pick_random_color
+from src.execution import resolve_strategy, submit_chunks, collect_chunks
+from src.noise import sample_noise
+from src.scattering import ScatteringLUT
+from src.config import shading_precision, tile_size, noise_refresh_interval
 
 from dataclasses import dataclass
-from itertools import product
-from functools import reduce
 
 from typing import Literal, Callable
 
-from concurrent.futures import ProcessPoolExecutor
-
 
 @dataclass
 class DistantStar:
@@ -22,6 +21,159 @@ class DistantStar:
     size: int
 
 
+class LayerBuffers:
+    # scratch for one tile of one layer, allocated once and written in place for every tile of every frame
+    def __init__(self, tile_size: int, dtype: np.dtype, palette_size: int = 2, padding: int = 0):
+        self.padding = padding
+        self.size = size = tile_size + 2 * padding
+        points = size * size
+
+        grid_y, grid_x = np.mgrid[0:size, 0:size]
+        self.grid_x = grid_x.ravel().astype(dtype)
+        self.grid_y = grid_y.ravel().astype(dtype)
+
+        # tile geometry, only the first count entries of the point buffers are valid
+        self.count = 0
+        self.x = np.empty(points, dtype)
+        self.y = np.empty(points, dtype)
+        self.distance = np.empty(points, dtype)
+        self.mask = np.empty(points, bool)
+        self.normals = np.empty((3, points), dtype)
+
+        # per frame scratch
+        self.light = np.empty(3, dtype)
+        self.matrix = np.empty((3, 3), dtype)
+        self.rotated = np.empty((3, points), dtype)
+        self.coords = np.empty((3, points), dtype)
+        self.lighting = np.empty(points, dtype)
+        self.noise = np.empty(points, dtype)
+        self.sampled = np.empty(points, dtype)
+        self.need = np.empty(points, bool)
+        # compaction of need, the extra last slot collects every point that is not needed
+        self.need_flags = np.empty(points, np.intp)
+        self.need_rank = np.empty(points, np.intp)
+        self.need_index = np.empty(points + 1, np.intp)
+        self.positions = np.arange(points)
+        self.color = np.empty((points, 3), dtype)
+        # contiguous staging for alpha lookups, np.take into the strided pixels[:, 3] column would buffer a copy
+        self.alpha = np.empty(points, np.uint8)
+        # row and column of the atmosphere lookup table
+        self.table_coords = np.empty((2, points), dtype)
+        self.above = np.empty(points, bool)
+        self.opaque = np.empty(points, bool)
+        self.visible = np.empty(points, bool)
+        self.shadow = np.empty(points, bool)
+        # covers the whole tile grid rather than the first count points, compressed through mask before use
+        self.grid_mask = np.empty(points, bool)
+        self.palette_index = np.empty(points, np.intp)
+        self.palette = np.zeros((palette_size, 3), dtype)
+        self.alpha_palette = np.zeros(palette_size, np.uint8)
+        self.pixels = np.empty((points, 4), np.uint8)
+        # tile position of every valid point, gathering and scattering through it allocates nothing unlike boolean masks
+        self.index = np.empty(0, np.intp)
+        self.tile_index: dict[tuple, tuple[int, np.ndarray]] = {}
+
+        # albedo per visible tile, reused by frames that only move the light
+        self.albedo: dict[tuple, tuple[np.ndarray, np.ndarray, np.ndarray]] = {}
+        self.albedo_key = None
+        self.albedo_age = 0
+        self._visited = set()
+
+        self.rgba = np.zeros((size, size, 4), np.uint8)
+        # one uint32 per pixel, so whole pixels are scattered with a single np.put
+        self.rgba_words = self.rgba.view(np.uint32).reshape(-1)
+        self.pixel_words = self.pixels.view(np.uint32).reshape(-1)
+
+    def place(self, x0: int, y0: int, width: int, height: int, radius: int) -> int:
+        # pixel coordinates relative to the planet center, padding extends the tile on every side
+        np.add(self.grid_x, x0 - self.padding, out=self.x)
+        np.add(self.grid_y, y0 - self.padding, out=self.y)
+
+        np.multiply(self.x, self.x, out=self.distance)
+        np.multiply(self.y, self.y, out=self.noise)
+        self.distance += self.noise
+        np.less_equal(self.distance, radius * radius, out=self.mask)
+
+        # tiles at the edge of the visible area only use part of the buffer
+        np.less(self.grid_x, width + 2 * self.padding, out=self.grid_mask)
+        self.mask &= self.grid_mask
+        np.less(self.grid_y, height + 2 * self.padding, out=self.grid_mask)
+        self.mask &= self.grid_mask
+
+        count = self.count = int(np.count_nonzero(self.mask))
+
+        # the index only changes with the tile, so it is built once and kept while the tile stays visible
+        tile = (x0, y0, width, height)
+        entry = self.tile_index.get(tile)
+        if entry is None or entry[0] != radius:
+            entry = self.tile_index[tile] = radius, np.flatnonzero(self.mask)
+        self.index = entry[1]
+        self._visited.add(tile)
+
+        norm_x, norm_y, norm_z = self.normals[:, :count]
+        np.take(self.x, self.index, out=norm_x, mode="clip")
+        norm_x /= radius
+        np.take(self.y, self.index, out=norm_y, mode="clip")
+        norm_y /= radius
+        np.take(self.distance, self.index, out=norm_z, mode="clip")
+        norm_z /= -radius * radius
+        norm_z += 1
+        np.maximum(norm_z, 0, out=norm_z)
+        np.sqrt(norm_z, out=norm_z)
+
+        return count
+
+    def load_albedo(self, tile: tuple, reset: bool = False):
+        # need marks the points of the tile whose albedo is not cached yet
+        count = self.count
+        entry = self.albedo.get(tile)
+        if entry is None or len(entry[0]) != count:
+            entry = self.albedo[tile] = np.zeros((count, 3), self.color.dtype), np.zeros(count, np.uint8), np.zeros(count, bool)
+        color, alpha, computed = entry
+        if reset:
+            alpha.fill(0)
+            computed.fill(False)
+
+        np.copyto(self.color[:count], color)
+        np.copyto(self.pixels[:count, 3], alpha)
+        np.logical_not(computed, out=self.need[:count])
+
+    def store_albedo(self, tile: tuple):
+        # merges the freshly sampled points into the cache, points never sampled stay transparent
+        count = self.count
+        color, alpha, computed = self.albedo[tile]
+        need = self.need[:count]
+        np.copyto(color, self.color[:count], where=need[:, None])
+        np.copyto(alpha, self.pixels[:count, 3], where=need)
+        computed |= need
+
+        np.copyto(self.color[:count], color)
+        np.copyto(self.pixels[:count, 3], alpha)
+
+    def need_positions(self) -> np.ndarray:
+        # positions of the points flagged in need, np.flatnonzero and np.compress would allocate them every tile
+        count = self.count
+        flags = self.need_flags[:count]
+        rank = self.need_rank[:count]
+        np.copyto(flags, self.need[:count])
+        np.cumsum(flags, out=rank)
+        sampled_count = int(rank[-1]) if count else 0
+
+        # points that are not needed get rank -1, which wraps onto the spare slot
+        rank *= flags
+        rank -= 1
+        np.put(self.need_index, rank, self.positions[:count], mode="wrap")
+        return self.need_index[:sampled_count]
+
+    def prune_tiles(self):
+        # tiles that left the screen are dropped so the caches follow the visible area
+        for tile in self.albedo.keys() - self._visited:
+            del self.albedo[tile]
+        for tile in self.tile_index.keys() - self._visited:
+            del self.tile_index[tile]
+        self._visited.clear()
+
+
 class Planet:
     def __init__(self, name: str, config: PlanetConfig):
         self.name = name
@@ -46,7 +198,25 @@ class Planet:
         # internal flags
         self._color_was_changed = False
         self._cloud_shift_increment = 0
-        # self.terrain_texture = self._generate_terrain_texture()
+        # each seed samples its own region of the shared noise field
+        self._noise_offset = None
+        if config.seed is not None:
+            self._noise_offset = np.random.default_rng(config.seed).uniform(0, 256, 3).astype(shading_precision)
+        # work buffers, sized to one tile so memory stays bounded however large the planet gets
+        dtype = np.dtype(shading_precision)
+        self._terrain_buffers = LayerBuffers(tile_size, dtype, len(self.terrains) + 1) if self.terrains else None
+        # clouds are rendered with a margin so shadows can be looked up past the tile edge
+        self._cloud_buffers = LayerBuffers(tile_size, dtype, padding=self.clouds._shadow_tilt) if self.clouds else None
+        self._atmosphere_buffers = LayerBuffers(tile_size, dtype) if self.atmosphere else None
+        # atmosphere
+        self._scattering = ScatteringLUT(dtype) if self.atmosphere else None
+        # composite of all layers, premultiplied, handed to the screen as one display format surface
+        # flat and channel first, so every tile views a contiguous (4, height, width) block, strided views make numpy buffer
+        self._composite = np.empty(4 * tile_size * tile_size, dtype)
+        self._composite_layer = np.empty(4 * tile_size * tile_size, dtype)
+        self._composite_transmitted = np.empty(tile_size * tile_size, dtype)
+        self._frame: np.ndarray = None
+        self._frame_surface: Surface = None
 
     # LIGHTING
 
@@ -62,10 +232,20 @@ class Planet:
 
         return lighting_dir_x, lighting_dir_y, lighting_dir_z
 
-    def _compute_lighting(self, normals: tuple, lighting_directions):
-        norm_x, norm_y, norm_z = normals
-        lighting_power = max(norm_x * lighting_directions[0] + norm_y * lighting_directions[1] + norm_z * lighting_directions[2], 0) * self.lighting.intensity
-        return lighting_power
+    @staticmethod
+    def _compute_opaque(buffers: LayerBuffers) -> np.ndarray:
+        # transparent pixels are left alone by the lighting pass
+        opaque = buffers.opaque[: buffers.count]
+        np.greater(buffers.pixels[: buffers.count, 3], 0, out=opaque)
+        return opaque
+
+    @staticmethod
+    def _compute_lighting(buffers: LayerBuffers, intensity: float, opaque: np.ndarray):
+        lighting = buffers.lighting[: buffers.count]
+        # as a (1, 3) by (3, count) matmul the strided normals go to blas directly, np.dot on a vector copies them first
+        np.matmul(buffers.light[None], buffers.normals[:, : buffers.count], out=lighting[None])
+        np.maximum(lighting, 0, out=lighting, where=opaque)
+        np.multiply(lighting, intensity, out=lighting, where=opaque)
 
     @staticmethod
     def _compute_angle_lighting_direction(angle) -> Vector:
@@ -90,327 +270,325 @@ class Planet:
 
     # ROTATION
 
-    _multiply_matrices = staticmethod(lambda *matrices: matrices[0] if len(matrices) == 1 else reduce(np.dot, matrices))
-
-    def _gen_rotation_matrix(self, rotation: Rotation) -> list[list] | None:
-        axis_rotation_matrices = []
-
-        if "x" in rotation.axis:
-            axis_rotation_matrices.append([[1, 0, 0], [0, cos(rotation.angle), -sin(rotation.angle)], [0, sin(rotation.angle), cos(rotation.angle)]])
-        if "y" in rotation.axis:
-            axis_rotation_matrices.append([[cos(rotation.angle), 0, sin(rotation.angle)], [0, 1, 0], [-sin(rotation.angle), 0, cos(rotation.angle)]])
-        if "z" in rotation.axis:
-            axis_rotation_matrices.append([[cos(rotation.angle), -sin(rotation.angle), 0], [sin(rotation.angle), cos(rotation.angle), 0], [0, 0, 1]])
-
-        return self._multiply_matrices(*axis_rotation_matrices) if axis_rotation_matrices else None
-
-    def _rotate_normals(self, norm_x, norm_y, norm_z, rotation: Rotation):
-        rotation_matrix = self._gen_rotation_matrix(rotation)
-
-        rotated_x = rotation_matrix[0][0] * norm_x + rotation_matrix[0][1] * norm_y + rotation_matrix[0][2] * norm_z
-        rotated_y = rotation_matrix[1][0] * norm_x + rotation_matrix[1][1] * norm_y + rotation_matrix[1][2] * norm_z
-        rotated_z = rotation_matrix[2][0] * norm_x + rotation_matrix[2][1] * norm_y + rotation_matrix[2][2] * norm_z
-
-        return rotated_x, rotated_y, rotated_z
+    @staticmethod
+    def _rotate_normals(buffers: LayerBuffers, normals: np.ndarray) -> np.ndarray:
+        rotated = buffers.rotated[:, : normals.shape[1]]
+        np.matmul(buffers.matrix, normals, out=rotated)
+        return rotated
 
     @staticmethod
     def _update_rotations(rotations: list[Rotation]):
         for rotation in rotations:
-            if rotation.speed > 0:
-                if rotation.direction == "left":
-                    rotation.angle += rotation.speed
-                else:
-                    rotation.angle -= rotation.speed
-                # stabilize angles between [0, 2pi]
-                rotation.angle %= 2 * pi
+            rotation.step()
 
     # TEXTURES
 
-    def _gen_texture_color(self, normals: tuple, lod: LevelOfDetail, gen_color: Callable, shift: float = 0):
-        if lod:
-            noise = self._gen_noise(normals, lod, shift)
-            # Normalize range from [-1, 1] to [0, 1]
-            noise_value = (noise + 1) / 2
-            return gen_color(noise_value=noise_value)
-        else:
-            return gen_color(normals=normals)
-
-    def _build_atmosphere(self, **kwargs):
-        normals = kwargs.get("normals")
-        _, _, norm_z = normals
-        # Compute alpha based on norm_z
-        alpha = 255 * self.atmosphere.density * norm_z
-        alpha = max(0, min(255, int(alpha)))
-        return self.atmosphere.color, alpha
-
-    def _build_terrain(self, **kwargs):
-        noise_value = kwargs.get("noise_value")
-        for terrain in self.terrains:
-            if noise_value <= terrain.threshold:
-                return terrain.color, 255
-        return None, None
-
-    def _build_clouds(self, **kwargs):
-        noise_value = kwargs.get("noise_value")
-        if noise_value > self.clouds.threshold:
-            return self.clouds.color, self.clouds.alpha
-        return None, None
-
-    def _apply_cloud_shadows(self, terrain_surface: Surface, clouds_surface: Surface) -> Surface:
-        width, height = terrain_surface.get_size()
-        cloud_width, cloud_height = clouds_surface.get_size()
+    def _build_atmosphere(self, buffers: LayerBuffers):
+        # rim glow and sunset tint come from the precomputed table, the light only picks the column
+        count = buffers.count
+        sun_cos = buffers.lighting[:count]
+        np.matmul(buffers.light[None], buffers.normals[:, :count], out=sun_cos[None])
+        table_index = buffers.palette_index[:count]
+        self._scattering.table_index(buffers.normals[2, :count], sun_cos, out=table_index, scratch=buffers.table_coords[:, :count])
+
+        color = buffers.color[:count]
+        np.take(self._scattering.rgb, table_index, axis=0, out=color, mode="clip")
+        np.take(self._scattering.alpha, table_index, out=buffers.alpha[:count], mode="clip")
+        np.copyto(buffers.pixels[:count, 3], buffers.alpha[:count])
+
+        color *= self.lighting.intensity
+        np.minimum(color, 255, out=color)
+
+    def _build_terrain(self, buffers: LayerBuffers):
+        # the first terrain whose threshold is not exceeded wins, the extra last palette entry stays transparent
+        for i, terrain in enumerate(self.terrains):
+            buffers.palette[i] = (terrain.color.r, terrain.color.g, terrain.color.b)
+            buffers.alpha_palette[i] = 255
+
+        count = buffers.count
+        palette_index = buffers.palette_index[:count]
+        palette_index.fill(len(self.terrains))
+        # walked in reverse so earlier terrains overwrite later ones, thresholds do not have to ascend
+        for i in reversed(range(len(self.terrains))):
+            np.less_equal(buffers.noise[:count], self.terrains[i].threshold, out=buffers.above[:count])
+            np.copyto(palette_index, i, where=buffers.above[:count])
+
+        self._apply_palette(buffers)
+
+    def _build_clouds(self, buffers: LayerBuffers):
+        color = self.clouds.color
+        buffers.palette[1] = (color.r, color.g, color.b)
+        buffers.alpha_palette[1] = self.clouds.alpha
+
+        count = buffers.count
+        np.greater(buffers.noise[:count], self.clouds.threshold, out=buffers.above[:count])
+        np.copyto(buffers.palette_index[:count], buffers.above[:count])
+
+        self._apply_palette(buffers)
 
+    @staticmethod
+    def _apply_palette(buffers: LayerBuffers):
+        count = buffers.count
+        np.take(buffers.palette, buffers.palette_index[:count], axis=0, out=buffers.color[:count], mode="clip")
+        np.take(buffers.alpha_palette, buffers.palette_index[:count], out=buffers.alpha[:count], mode="clip")
+        np.copyto(buffers.pixels[:count, 3], buffers.alpha[:count])
+
+    def _apply_cloud_shadows(self, terrain_buffers: LayerBuffers, cloud_buffers: LayerBuffers):
         # Calculate shadow offsets based on light direction
         x_shadow_offset = int(self.lighting._direction.x * self.clouds._shadow_tilt)
         y_shadow_offset = int(self.lighting._direction.y * self.clouds._shadow_tilt)
 
-        for x, y in product(range(width), range(height)):
-            # Determine cloud position based on shadow offsets
-            cloud_x, cloud_y = x - x_shadow_offset, y - y_shadow_offset
-
-            # only process if shadow position is within cloud surface bounds
-            is_in_surface_bounds_x = 0 <= cloud_x < cloud_width
-            is_in_surface_bounds_y = 0 <= cloud_y < cloud_height
-            if is_in_surface_bounds_x and is_in_surface_bounds_y:
-                # check if a cloud is visible at this pixel
-                cloud_pixel = clouds_surface.get_at((cloud_x, cloud_y))
-                # if a cloud is visible at this pixel
-                if cloud_pixel.a > 0:
-                    # get the terrain pixel position
-                    terrain_pixel = terrain_surface.get_at((x, y))
-                    # add the cloud shadow color to the terrain pixel
-                    terrain_surface.set_at(
-                        (x, y),
-                        (
-                            int(terrain_pixel.r * self.clouds.shadow_alpha),
-                            int(terrain_pixel.g * self.clouds.shadow_alpha),
-                            int(terrain_pixel.b * self.clouds.shadow_alpha),
-                            terrain_pixel.a,
-                        ),
-                    )
-
-        return terrain_surface
+        # the cloud tile carries a margin of _shadow_tilt pixels, so the shifted lookup never leaves it
+        size = terrain_buffers.size
+        x_start = cloud_buffers.padding - x_shadow_offset
+        y_start = cloud_buffers.padding - y_shadow_offset
+        covered = terrain_buffers.grid_mask.reshape(size, size)
+        np.greater(cloud_buffers.rgba[y_start : y_start + size, x_start : x_start + size, 3], 0, out=covered)
 
-    @staticmethod
-    def _gen_noise(normals: tuple, lod: LevelOfDetail, shift: float = 0):
-        norm_x, norm_y, norm_z = normals
-
-        # TODO: dynamic lod: performance increase by reducing lod when unlit
-        # NOTE: is it correct to implement this here tho?
-
-        return (
-            opensimplex.noise3(
-                (norm_x * lod.frequency) + shift,
-                (norm_y * lod.frequency) + shift,
-                (norm_z * lod.frequency) + shift,
-            )
-            * lod.weight
-        )
-
-    # def _gen_texture_color(self, normals: tuple, lod: LevelOfDetail, gen_color: Callable, shift: float = 0):
-    #     if lod:
-    #         noise = self._gen_noise(normals, lod, shift)
-    #         # Normalize range from [-1, 1] to [0, 1]
-    #         noise_value = (noise + 1) / 2
-    #         return gen_color(noise_value)
-    #     else:
-    #         return gen_color()
+        count = terrain_buffers.count
+        shadow = terrain_buffers.shadow[:count]
+        np.take(terrain_buffers.grid_mask, terrain_buffers.index, out=shadow, mode="clip")
+        # channel by channel, a broadcast (count, 1) mask makes numpy buffer the whole operation
+        for channel in terrain_buffers.color[:count].T:
+            np.multiply(channel, self.clouds.shadow_alpha, out=channel, where=shadow)
 
     @staticmethod
-    def _apply_lighting_to_texture(rgba, lighting_power: float):
-        color, alpha = rgba
-
-        if color:
-            # Mix color with lighting for final texture
-            r = min(int(color.r * lighting_power), 255)
-            g = min(int(color.g * lighting_power), 255)
-            b = min(int(color.b * lighting_power), 255)
+    def _apply_lighting_to_texture(buffers: LayerBuffers, opaque: np.ndarray):
+        # Mix color with lighting for final texture
+        lighting = buffers.lighting[: buffers.count]
+        for channel in buffers.color[: buffers.count].T:
+            np.multiply(channel, lighting, out=channel, where=opaque)
+            np.minimum(channel, 255, out=channel, where=opaque)
 
-            return (r, g, b, alpha)
-        else:
-            return (0, 0, 0, 0)
-
-    def _gen_texture(self, normals: tuple, lighting_power: float, lod: LevelOfDetail, gen_color: Callable, shift: float = 0):
-        rgba = self._gen_texture_color(normals, lod, gen_color, shift)
-        texture = self._apply_lighting_to_texture(rgba, lighting_power)
-        return texture
+    @staticmethod
+    def _write_pixels(buffers: LayerBuffers):
+        count = buffers.count
+        np.copyto(buffers.pixels[:count, :3], buffers.color[:count], casting="unsafe")
+        buffers.rgba.fill(0)
+        np.put(buffers.rgba_words, buffers.index, buffers.pixel_words[:count], mode="clip")
 
     # MAIN
 
-    @staticmethod
-    def _get_normals(x, y, inv_radius):
-        return x * inv_radius, y * inv_radius, sqrt(max(0, 1 - (x * x + y * y) * inv_radius * inv_radius))
-
-    def _draw_sphere_texture_chunk(
-        self,
-        radius: int,
-        radius_sq: int,
-        inv_radius: float,
-        lod: LevelOfDetail,
-        texture_func: Callable,
-        rotation: Rotation,
-        shift: int,
-        x_start: int,
-        x_end: int,
-        y_start: int,
-        y_end: int,
-    ):
-        texture_data = {}
-        lighting_directions = self._get_inverted_lighting_normals()
-
-        for x, y in product(range(x_start, x_end), range(y_start, y_end)):
-            if (x * x) + (y * y) <= radius_sq:
-                norm_x, norm_y, norm_z = self._get_normals(x, y, inv_radius)
-
-                lighting_power = self._compute_lighting((norm_x, norm_y, norm_z), lighting_directions)
-
-                if rotation:
-                    norm_x, norm_y, norm_z = self._rotate_normals(norm_x, norm_y, norm_z, rotation=rotation)
-
-                texture = self._gen_texture(
-                    normals=(norm_x, norm_y, norm_z),
-                    lighting_power=lighting_power,
-                    shift=shift,
-                    lod=lod,
-                    gen_color=texture_func,
-                )
-
-                texture_data[(x + radius, y + radius)] = texture
-        return texture_data
-
-    def _draw_sphere_texture_parallel(
-        self,
-        radius: int,
-        lod: LevelOfDetail,
-        texture_func: Callable,
-        rotation: Rotation,
-        shift: int = 0,
-    ):
-        num_chunks = 12  # Set number of chunks equal to the number of CPU cores
-        chunk_size = int(sqrt(num_chunks))  # Calculate chunk size
-        futures = []
-
-        radius_sq = radius * radius
-        inv_radius = 1 / radius
-
-        with ProcessPoolExecutor() as executor:
-            for i in range(num_chunks):
-                x_start = (i % chunk_size) * (2 * radius // chunk_size) - radius
-                x_end = x_start + (2 * radius // chunk_size)
-                y_start = (i // chunk_size) * (2 * radius // chunk_size) - radius
-                y_end = y_start + (2 * radius // chunk_size)
-
-                futures.append(
-                    executor.submit(
-                        self._draw_sphere_texture_chunk,
-                        radius,
-                        radius_sq,
-                        inv_radius,
-                        lod,
-                        texture_func,
-                        rotation,
-                        shift,
-                        x_start,
-                        x_end,
-                        y_start,
-                        y_end,
-                    )
-                )
-
-            texture_data = {}
-            for future in futures:
-                texture_data.update(future.result())
-
-        return texture_data
-
-    @staticmethod
-    def _process_texture_result(future, radius):
-        texture_data = future.result()
-        surface = Surface((2 * radius, 2 * radius), SRCALPHA)
-
-        for pos, color in texture_data.items():
-            surface.set_at(pos, color)
-
-        return surface
-
-    def _gen_terrain_and_clouds_surfaces(self):
-        with ProcessPoolExecutor() as executor:
-
-            # TERRAIN thread
-            terrain_future = None
-            if self.terrains:
-                terrain_future = executor.submit(
-                    self._draw_sphere_texture_parallel,
-                    self.radius,
-                    self.terrain_lod,
-                    self._build_terrain,
-                    self.planet_rotation,
-                )
-
-            # CLOUDS thread
-            clouds_future = None
+    def _prepare_layer(self, buffers: LayerBuffers, rotation: Rotation = None):
+        # per frame state shared by every tile of the layer
+        buffers.light[:] = self._get_inverted_lighting_normals()
+        # one matrix per frame, applied to the whole normal buffer of each tile in a single matmul
+        if rotation:
+            buffers.matrix[:] = rotation.matrix
+        else:
+            buffers.matrix.fill(0)
+            np.fill_diagonal(buffers.matrix, 1)
+
+    def _should_refresh(self, buffers: LayerBuffers, key: tuple) -> bool:
+        # noise only reruns once the texture moved, and at most every noise_refresh_interval frames
+        buffers.albedo_age += 1
+        if key == buffers.albedo_key or buffers.albedo_age < noise_refresh_interval:
+            return False
+
+        buffers.albedo_key = key
+        buffers.albedo_age = 0
+        return True
+
+    def _submit_layer(self, buffers: LayerBuffers, lod: LevelOfDetail, shift: float = 0) -> list | None:
+        # noise is only sampled for the points flagged in need, the texture follows the rotation, lighting does not
+        need_index = buffers.need_positions()
+        sampled_count = len(need_index)
+        if not sampled_count:
+            return None
+
+        coords = buffers.coords[:, :sampled_count]
+        for normal, coord in zip(buffers.normals, coords):
+            np.take(normal, need_index, out=coord, mode="clip")
+        rotated = self._rotate_normals(buffers, coords)
+        np.multiply(rotated, lod.frequency, out=coords)
+        offsets = self._noise_offset if self._noise_offset is not None else (0, 0, 0)
+        for coord, offset in zip(coords, offsets):
+            coord += shift + offset
+        return submit_chunks(resolve_strategy(sampled_count), sample_noise, coords, buffers.sampled[:sampled_count])
+
+    def _collect_layer(self, buffers: LayerBuffers, pending: list | None, lod: LevelOfDetail, texture_func: Callable, tile: tuple):
+        if pending is None:
+            return
+
+        need = buffers.need[: buffers.count]
+        sampled = buffers.sampled[: np.count_nonzero(need)]
+        collect_chunks(pending, sampled)
+        # Normalize range from [-1, 1] to [0, 1]
+        sampled *= lod.weight
+        sampled += 1
+        sampled /= 2
+        np.place(buffers.noise[: buffers.count], need, sampled)
+
+        texture_func(buffers)
+        buffers.store_albedo(tile)
+
+    def _cull_hidden_terrain(self, terrain_buffers: LayerBuffers, cloud_buffers: LayerBuffers) -> np.ndarray:
+        # terrain under fully opaque cloud is neither sampled nor shaded
+        size = terrain_buffers.size
+        padding = cloud_buffers.padding
+        uncovered = terrain_buffers.grid_mask.reshape(size, size)
+        np.less(cloud_buffers.rgba[padding : padding + size, padding : padding + size, 3], 255, out=uncovered)
+
+        count = terrain_buffers.count
+        visible = terrain_buffers.visible[:count]
+        np.take(terrain_buffers.grid_mask, terrain_buffers.index, out=visible, mode="clip")
+        terrain_buffers.need[:count] &= visible
+        return visible
+
+    def _shade_layer(self, buffers: LayerBuffers):
+        opaque = self._compute_opaque(buffers)
+        self._compute_lighting(buffers, self.lighting.intensity, opaque)
+        self._apply_lighting_to_texture(buffers, opaque)
+
+    @property
+    def layer_radii(self) -> list[int]:
+        radii = [self.radius, self._cloud_radius, self.atmosphere._radius if self.atmosphere else None]
+        return [radius for radius in radii if radius]
+
+    @property
+    def noise_sizes(self) -> list[int]:
+        # largest noise submission per layer, one tile clipped to the layer's disk
+        layers = [(self._terrain_buffers, self.radius), (self._cloud_buffers, self._cloud_radius)]
+        return [min(buffers.size**2, int(pi * radius * radius) + 1) for buffers, radius in layers if buffers]
+
+    def _render_tile(self, x0: int, y0: int, width: int, height: int, refresh_terrain: bool, refresh_clouds: bool) -> list[LayerBuffers]:
+        tile = (x0, y0, width, height)
+        # fully opaque clouds are finished first so terrain noise is only sampled where it can be seen,
+        # otherwise noise for both layers is submitted before any is collected so their chunks share the pool
+        occluding = self.clouds and self.clouds.alpha >= 255
+
+        # TERRAIN
+        terrain_pending = None
+        if self.terrains:
+            self._terrain_buffers.place(x0, y0, width, height, self.radius)
+            self._terrain_buffers.load_albedo(tile, reset=refresh_terrain)
+            if not occluding:
+                terrain_pending = self._submit_layer(self._terrain_buffers, self.terrain_lod)
+
+        # CLOUDS
+        if self.clouds:
+            self._cloud_buffers.place(x0, y0, width, height, self._cloud_radius)
+            self._cloud_buffers.load_albedo(tile, reset=refresh_clouds)
+            clouds_pending = self._submit_layer(self._cloud_buffers, self.clouds.lod, self._cloud_shift_increment)
+            self._collect_layer(self._cloud_buffers, clouds_pending, self.clouds.lod, self._build_clouds, tile)
+            self._shade_layer(self._cloud_buffers)
+            self._write_pixels(self._cloud_buffers)
+
+        if self.terrains:
+            if occluding:
+                visible = self._cull_hidden_terrain(self._terrain_buffers, self._cloud_buffers)
+                terrain_pending = self._submit_layer(self._terrain_buffers, self.terrain_lod)
+            self._collect_layer(self._terrain_buffers, terrain_pending, self.terrain_lod, self._build_terrain, tile)
+            if occluding:
+                # cached albedo may still hold points that are hidden by now, they are skipped as transparent
+                self._terrain_buffers.pixels[: self._terrain_buffers.count, 3] *= visible
+            self._shade_layer(self._terrain_buffers)
             if self.clouds:
-                self._cloud_shift_increment += self.wind_speed
-                clouds_future = executor.submit(
-                    self._draw_sphere_texture_parallel,
-                    self._cloud_radius,
-                    self.clouds.lod,
-                    self._build_clouds,
-                    self.clouds.rotation,
-                    self._cloud_shift_increment,
-                )
-
-            # ATMOSPHERE thread
-            # assert self.atmosphere
-            atmosphere_future = None
-            if self.atmosphere:
-                atmosphere_future = executor.submit(
-                    self._draw_sphere_texture_parallel,
-                    self.atmosphere._radius,
-                    self.atmosphere.lod,
-                    # self.clouds.lod,
-                    texture_func=self._build_atmosphere,
-                    # self.clouds.rotation,
-                    rotation=None,
-                )
-
-            # COLLECT RESULTS
-            terrain_surface = None
-            if terrain_future:
-                terrain_surface = self._process_texture_result(terrain_future, self.radius)
-
-            clouds_surface = None
-            if clouds_future:
-                clouds_surface = self._process_texture_result(clouds_future, self._cloud_radius)
-            if clouds_surface and terrain_surface:
-                terrain_surface = self._apply_cloud_shadows(terrain_surface, clouds_surface)
-
-            # assert atmosphere_future
-            atmosphere_surface = None
-            if atmosphere_future:
-                atmosphere_surface = self._process_texture_result(atmosphere_future, self.atmosphere._radius)
-
-        return terrain_surface, clouds_surface, atmosphere_surface
-
-    def _blit_surface(self, screen, surface, x, y, radius):
-        screen.blit(surface, (x - radius, y - radius))
-
-    def draw(self, screen: Surface):
-        terrain_surface, clouds_surface, atmosphere_surface = self._gen_terrain_and_clouds_surfaces()
+                self._apply_cloud_shadows(self._terrain_buffers, self._cloud_buffers)
+            self._write_pixels(self._terrain_buffers)
+
+        # ATMOSPHERE
+        if self.atmosphere:
+            self._atmosphere_buffers.place(x0, y0, width, height, self.atmosphere._radius)
+            self._build_atmosphere(self._atmosphere_buffers)
+            self._write_pixels(self._atmosphere_buffers)
+
+        layers = [self._terrain_buffers, self._cloud_buffers, self._atmosphere_buffers]
+        return [buffers for buffers in layers if buffers and buffers.count]
+
+    def _visible_rect(self, screen: Surface) -> Rect:
+        # only the part of the outermost layer that is on screen gets rendered
+        outer_radius = max(self.layer_radii)
+        bounds = Rect(self.position.x - outer_radius, self.position.y - outer_radius, 2 * outer_radius, 2 * outer_radius)
+        return bounds.clip(screen.get_rect())
+
+    def _composite_tile(self, layers: list[LayerBuffers], x: int, y: int, width: int, height: int):
+        # layers go over each other back to front in the array domain, out = layer * a + out * (1 - a)
+        area = width * height
+        composite = self._composite[: 4 * area].reshape(4, height, width)
+        layer = self._composite_layer[: 4 * area].reshape(4, height, width)
+        transmitted = self._composite_transmitted[:area].reshape(height, width)
+        composite.fill(0)
+
+        for buffers in layers:
+            padding = buffers.padding
+            np.copyto(layer, np.moveaxis(buffers.rgba[padding : padding + height, padding : padding + width], -1, 0))
+            np.divide(layer[3], 255, out=transmitted)
+            layer[:3] *= transmitted
+
+            np.subtract(1, transmitted, out=transmitted)
+            composite *= transmitted
+            composite += layer
+
+        np.copyto(self._frame[y : y + height, x : x + width], np.moveaxis(composite, 0, -1), casting="unsafe")
+
+    def _upload_frame(self, straight_alpha: bool) -> Surface:
+        height, width = self._frame.shape[:2]
+        if self._frame_surface is None or self._frame_surface.get_size() != (width, height):
+            surface = Surface((width, height), SRCALPHA)
+            # converted once per size, after that pixels are written straight into the display format
+            self._frame_surface = surface.convert_alpha() if display.get_surface() else surface
+
+        frame = self._frame
+        if straight_alpha:
+            # targets with their own alpha (e.g. batch thumbnails) get regular straight alpha
+            alpha = frame[..., 3:].astype(np.float32)
+            frame = np.dstack([np.where(alpha > 0, frame[..., :3] * (255 / np.maximum(alpha, 1)), 0).astype(np.uint8), frame[..., 3:]])
+
+        pixels = surfarray.pixels3d(self._frame_surface)
+        pixels[...] = frame[..., :3].transpose(1, 0, 2)
+        del pixels
+        pixels = surfarray.pixels_alpha(self._frame_surface)
+        pixels[...] = frame[..., 3].T
+        del pixels
+
+        return self._frame_surface
+
+    def draw(self, screen: Surface) -> Rect:
         rotations = []
 
-        if terrain_surface:
+        # albedo (noise and palette) is regenerated only when rotation, wind or colors changed, lighting runs every frame
+        refresh_terrain = refresh_clouds = False
+
+        if self.terrains:
             rotations.append(self.planet_rotation)
-            self._blit_surface(screen, terrain_surface, self.position.x, self.position.y, self.radius)
+            self._prepare_layer(self._terrain_buffers, self.planet_rotation)
+            terrain_key = (self.planet_rotation._orientation, [(terrain.color, terrain.threshold) for terrain in self.terrains])
+            refresh_terrain = self._should_refresh(self._terrain_buffers, terrain_key)
 
-        if clouds_surface:
+        if self.clouds:
             rotations.append(self.clouds.rotation)
-            self._blit_surface(screen, clouds_surface, self.position.x, self.position.y, self._cloud_radius)
-
-        if atmosphere_surface:
-            # TODO: atmospheric affects: new sphere with gradient opacity
-            # - perhaps even scattering calculated from the light direction
-            self._blit_surface(screen, atmosphere_surface, self.position.x, self.position.y, self.atmosphere._radius)
+            self._prepare_layer(self._cloud_buffers, self.clouds.rotation)
+            self._cloud_shift_increment += self.wind_speed
+            cloud_key = (self.clouds.rotation._orientation, self._cloud_shift_increment, self.clouds.color, self.clouds.alpha, self.clouds.threshold)
+            refresh_clouds = self._should_refresh(self._cloud_buffers, cloud_key)
+
+        if self.atmosphere:
+            self._prepare_layer(self._atmosphere_buffers)
+            # rebuilt only when the atmosphere itself changes
+            self._scattering.update(self.atmosphere)
+
+        # tile by tile, so cost follows the visible pixels rather than the radius
+        visible = self._visible_rect(screen)
+        if self._frame is None or self._frame.shape[:2] != (visible.height, visible.width):
+            self._frame = np.zeros((visible.height, visible.width, 4), np.uint8)
+
+        for y in range(visible.top, visible.bottom, tile_size):
+            for x in range(visible.left, visible.right, tile_size):
+                width = min(tile_size, visible.right - x)
+                height = min(tile_size, visible.bottom - y)
+                layers = self._render_tile(x - self.position.x, y - self.position.y, width, height, refresh_terrain, refresh_clouds)
+                self._composite_tile(layers, x - visible.left, y - visible.top, width, height)
+
+        # one blit per planet
+        if visible.width and visible.height:
+            straight_alpha = bool(screen.get_flags() & SRCALPHA)
+            surface = self._upload_frame(straight_alpha)
+            screen.blit(surface, visible.topleft, special_flags=0 if straight_alpha else BLEND_PREMULTIPLIED)
+
+        for buffers in (self._terrain_buffers, self._cloud_buffers, self._atmosphere_buffers):
+            if buffers:
+                buffers.prune_tiles()
 
         # Update lighting and rotations
         self._update_lighting()
@@ -418,3 +596,5 @@ class Planet:
 
         if self.color_mode == "change":
             self._change_color_when_dark()
+
+        return visible
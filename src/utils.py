@@ -1,4 +1,4 @@
-from math import sqrt
+from math import sqrt, cos, sin
 from dataclasses import dataclass, field
 from random import randint
 from typing import Literal
@@ -91,12 +91,44 @@ class Lighting:
     _direction: Vector = Vector(0, 0, 0)
 
 
+def _quaternion_multiply(a: tuple, b: tuple) -> tuple:
+    aw, ax, ay, az = a
+    bw, bx, by, bz = b
+    return (
+        aw * bw - ax * bx - ay * by - az * bz,
+        aw * bx + ax * bw + ay * bz - az * by,
+        aw * by - ax * bz + ay * bw + az * bx,
+        aw * bz + ax * by - ay * bx + az * bw,
+    )
+
+
+def _quaternion_from_rotation_vector(x: float, y: float, z: float) -> tuple:
+    # rotation by |v| radians around v
+    angle = sqrt(x * x + y * y + z * z)
+    if angle == 0:
+        return (1.0, 0.0, 0.0, 0.0)
+    scale = sin(angle / 2) / angle
+    return (cos(angle / 2), x * scale, y * scale, z * scale)
+
+
+def _quaternion_to_matrix(q: tuple) -> tuple:
+    w, x, y, z = q
+    return (
+        (1 - 2 * (y * y + z * z), 2 * (x * y - w * z), 2 * (x * z + w * y)),
+        (2 * (x * y + w * z), 1 - 2 * (x * x + z * z), 2 * (y * z - w * x)),
+        (2 * (x * z - w * y), 2 * (y * z + w * x), 1 - 2 * (x * x + y * y)),
+    )
+
+
 @dataclass
 class Rotation:
     direction: Literal["left", "right"] = "left"
     speed: float = 0.1
     axis: list[Literal["x", "y", "z"]] = None
-    angle: float = 0.0
+    angle: float = 0.0  # starting angle around every axis in axis
+    angular_velocity: tuple[float, float, float] = None  # radians per frame around x, y and z, replaces direction, speed and axis
+    _orientation: tuple = None
+    _matrix: tuple = None
 
     def __post_init__(self):
         if not self.axis:
@@ -104,6 +136,36 @@ class Rotation:
         if not isinstance(self.axis, list):
             self.axis = [self.axis]
 
+        # same starting pose as the old per axis matrices multiplied in x, y, z order
+        self._orientation = (1.0, 0.0, 0.0, 0.0)
+        for axis in "xyz":
+            if axis in self.axis:
+                rotation_vector = [self.angle if axis == name else 0.0 for name in "xyz"]
+                self._orientation = _quaternion_multiply(self._orientation, _quaternion_from_rotation_vector(*rotation_vector))
+        self._matrix = _quaternion_to_matrix(self._orientation)
+
+    @property
+    def matrix(self) -> tuple:
+        # cached until the next step
+        return self._matrix
+
+    @property
+    def velocity(self) -> tuple[float, float, float]:
+        if self.angular_velocity is not None:
+            return self.angular_velocity
+        speed = self.speed if self.direction == "left" else -self.speed
+        return tuple(speed if axis in self.axis else 0.0 for axis in "xyz")
+
+    def step(self):
+        # all axes spin at once, accumulated in a quaternion and renormalized so rounding never drifts into scale
+        velocity = self.velocity
+        if not any(velocity):
+            return
+        w, x, y, z = _quaternion_multiply(self._orientation, _quaternion_from_rotation_vector(*velocity))
+        length = sqrt(w * w + x * x + y * y + z * z)
+        self._orientation = (w / length, x / length, y / length, z / length)
+        self._matrix = _quaternion_to_matrix(self._orientation)
+
 
 @dataclass
 class LevelOfDetail:
@@ -145,6 +207,7 @@ class PlanetConfig:
     color_mode: Literal["solid", "change"] = "solid"
     lighting: Lighting = Lighting
     planet_rotation: Rotation = Rotation
+    seed: int = None  # moves the planet to its own region of the noise field
 
     def __post_init__(self):
         if not self.terrains: